@@ -2,36 +2,31 @@
 Custom integration to provide adaptive scheduling in Home Assistant.
 
 For more details about this integration, please refer to URL
+
+Home Assistant is only imported when the integration is set up, so that the planning modules (engine, thermal,
+schedule, planner and backtest) can be run as python -m heating_automation.planner without Home Assistant installed.
 """
 
+from __future__ import annotations
+
 import asyncio
 import logging
 
-from datetime import timedelta
-
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import Config, HomeAssistant
-from homeassistant.exceptions import ConfigEntryNotReady
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-    UpdateFailed,
-)
+from typing import TYPE_CHECKING
 
 from .const import (
     DOMAIN,
-    NAME,
-    PLATFORMS
+    PLATFORMS,
+    SERVICE_PROFILE,
+    ATTR_CYCLES
 )
 
-from .helpers import (
-    get_room_entities
-)
+if TYPE_CHECKING:
+    from homeassistant.config_entries import ConfigEntry
+    from homeassistant.core import Config, HomeAssistant
 
 _LOGGER = logging.getLogger(__name__)
 
-SCAN_INTERVAL = timedelta(seconds=60)
-
 
 async def async_setup(hass: HomeAssistant, config: Config):
     """Set up this integration using YAML is not supported."""
@@ -39,6 +34,8 @@ async def async_setup(hass: HomeAssistant, config: Config):
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
+    from homeassistant.exceptions import ConfigEntryNotReady
+    from .coordinator import HeatingAutomationCoordinator, PROFILE_SCHEMA
 
     if hass.data.get(DOMAIN) is None:
         hass.data.setdefault(DOMAIN, {})
@@ -61,12 +58,32 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         )
 
     entry.add_update_listener(async_reload_entry)
+
+    if not hass.services.has_service(DOMAIN, SERVICE_PROFILE):
+        async def async_profile(call):
+            """Profile the next cycles of every coordinator."""
+            for coordinator in hass.data[DOMAIN].values():
+                coordinator.start_profiling(call.data[ATTR_CYCLES])
+
+        hass.services.async_register(DOMAIN, SERVICE_PROFILE, async_profile, schema=PROFILE_SCHEMA)
     
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     coordinator = hass.data[DOMAIN][entry.entry_id]
-    hass.data[DOMAIN].pop(entry.entry_id)
+    unloaded = all(
+        await asyncio.gather(
+            *[
+                hass.config_entries.async_forward_entry_unload(entry, platform)
+                for platform in PLATFORMS
+                if platform in coordinator.platforms
+            ]
+        )
+    )
+    if unloaded:
+        hass.data[DOMAIN].pop(entry.entry_id)
+        if not hass.data[DOMAIN]:
+            hass.services.async_remove(DOMAIN, SERVICE_PROFILE)
 
     return unloaded
 
@@ -74,34 +91,3 @@ async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Reload config entry."""
     await async_unload_entry(hass, entry)
     await async_setup_entry(hass, entry)
-
-class HeatingAutomationCoordinator(DataUpdateCoordinator):
-
-    def __init__(self, hass, config):
-        self.platforms = []
-        self.hass = hass
-        self._rooms = get_room_entities(hass)
-        self._flow_temp = hass.data['sensor'].get_entity('sensor.panasonic_heat_pump_main_main_target_temp')
-        self._ambient_temp = hass.data['sensor'].get_entity('sensor.panasonic_heat_pump_main_outside_temp')
-        super().__init__(
-            hass,
-            _LOGGER,
-            name = NAME,
-            update_interval = SCAN_INTERVAL
-        )
-
-    async def _async_update_data(self):
-        _LOGGER.debug("Heating Automation polled")
-        return True
-
-    @property 
-    def rooms(self):
-        return self._rooms
-    
-    @property
-    def flow_temperature(self):
-        return self._flow_temp.state
-        
-    @property    
-    def outside_temperature(self):
-        return self._ambient_temp.state
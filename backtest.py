@@ -0,0 +1,150 @@
+"""
+    Backtesting of heating coefficients against recorded HEATING phases.
+
+        python -m heating_automation.backtest HISTORY [--tables TABLES] [--grid c0=START:STOP:STEP ...] [--late-weight W]
+
+    It needs only numpy, not Home Assistant, which the package imports only when the integration is set up.
+
+    HISTORY is a JSON lines file of phases, as logged in the room sensor attributes:
+        {"room", "on_time", "on_temperature", "off_time", "off_temperature", "flow_temp", "ambient_temp", "target_temperature"}
+    Only phases that rose, and reached their target where one is given, are used.
+    TABLES is a JSON list of coefficient tables in the HEATING_RATES form {room: [c0, c1, c2]}.
+    The grid gives ranges for each coefficient, default the current value, and every triple in the grid is tried for every room.
+
+    For a candidate, a phase's planned preheat is the heating_time prediction from its starting conditions.
+    Had heating started that long before the schedule change, the room would have arrived late by the amount the
+    actual phase took longer than planned, or early, wasting preheat, by the amount it took less.
+    All candidates are evaluated against all phases as array operations, in blocks to bound memory.
+"""
+import argparse
+from collections import namedtuple
+from datetime import datetime
+import json
+
+import numpy as np
+
+from .const import HEATING_RATES
+from .thermal import heating_times
+
+Phases = namedtuple("Phases", ["rooms", "room", "curr", "target", "flow", "oat", "actual"])
+
+"""Candidates evaluated together, bounding the (candidates, phases) working arrays."""
+BLOCK = 2048
+
+
+def _time(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def load_phases(lines):
+    """Phases from an iterable of JSON lines, as arrays indexed by phase, with room the index into rooms."""
+    rooms = {}
+    columns = {key: [] for key in Phases._fields if key != "rooms"}
+    for line in lines:
+        if not line.strip():
+            continue
+        p = json.loads(line)
+        if None in (p.get("on_time"), p.get("off_time"), p.get("on_temperature"), p.get("off_temperature"), p.get("flow_temp"), p.get("ambient_temp")):
+            continue
+        on_temp, off_temp = float(p["on_temperature"]), float(p["off_temperature"])
+        target = p.get("target_temperature")
+        if off_temp <= on_temp or (target is not None and off_temp < float(target)):
+            continue
+        columns["room"].append(rooms.setdefault(p["room"], len(rooms)))
+        columns["curr"].append(on_temp)
+        columns["target"].append(off_temp)
+        columns["flow"].append(float(p["flow_temp"]))
+        columns["oat"].append(float(p["ambient_temp"]))
+        columns["actual"].append((_time(p["off_time"]) - _time(p["on_time"])).total_seconds()/60)
+    arrays = {key: np.asarray(values, dtype=int if key == "room" else float) for key, values in columns.items()}
+    return Phases(rooms=list(rooms), **arrays)
+
+
+def predicted_minutes(phases, coeffs):
+    """
+        heating_time for every candidate and phase at once, as a (candidates, phases) array.
+        coeffs is (candidates, rooms, 3). Candidates that predict no heating, or a non-positive rate, plan no preheat.
+    """
+    return heating_times(coeffs[:, phases.room], phases.curr, phases.target, phases.flow, phases.oat)
+
+
+def evaluate(phases, coeffs):
+    """
+        Late and early (wasted preheat) minutes, summed per room, as two (candidates, rooms) arrays.
+        Per-room sums are a product with the one-hot phase to room matrix, so the whole block stays vectorised.
+    """
+    coeffs = np.asarray(coeffs, dtype=float)
+    onehot = np.zeros((len(phases.room), len(phases.rooms)))
+    onehot[np.arange(len(phases.room)), phases.room] = 1
+    late = np.empty((len(coeffs), len(phases.rooms)))
+    early = np.empty_like(late)
+    for start in range(0, len(coeffs), BLOCK):
+        error = phases.actual - predicted_minutes(phases, coeffs[start:start + BLOCK])
+        late[start:start + BLOCK] = np.maximum(error, 0) @ onehot
+        early[start:start + BLOCK] = np.maximum(-error, 0) @ onehot
+    return late, early
+
+
+def table_coeffs(phases, tables):
+    """Coefficient tables in the HEATING_RATES form as a (tables, rooms, 3) array. Rooms missing from a table plan no preheat."""
+    return np.array([[table.get(room, (0, 0, 0)) for room in phases.rooms] for table in tables], dtype=float).reshape(-1, len(phases.rooms), 3)
+
+
+def grid_coeffs(phases, ranges):
+    """
+        Every (c0, c1, c2) triple from the ranges, for every room, as a (triples, rooms, 3) array.
+        ranges maps a coefficient index to its values; coefficients without a range keep each room's current value.
+    """
+    current = table_coeffs(phases, [HEATING_RATES])[0]
+    axes = [np.asarray(ranges.get(i, [np.nan]), dtype=float) for i in range(3)]
+    triples = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+    coeffs = np.broadcast_to(triples[:, None, :], (len(triples), len(phases.rooms), 3)).copy()
+    return np.where(np.isnan(coeffs), current[None], coeffs)
+
+
+def _range(text):
+    name, _, spec = text.partition("=")
+    start, stop, step = (float(v) for v in spec.split(":"))
+    return int(name.strip().lstrip("c")), np.arange(start, stop + step/2, step)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m heating_automation.backtest", description="Backtest heating coefficients.")
+    parser.add_argument("history", help="JSON lines file of recorded phases")
+    parser.add_argument("--tables", help="JSON list of coefficient tables to compare")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="cN=START:STOP:STEP", help="coefficient ranges to search per room")
+    parser.add_argument("--late-weight", type=float, default=1.0, help="weight of late minutes against wasted preheat in choosing the best")
+    args = parser.parse_args(argv)
+
+    with open(args.history) as f:
+        phases = load_phases(f)
+    if len(phases.room) == 0:
+        print("No usable phases")
+        return
+
+    late, early = evaluate(phases, table_coeffs(phases, [HEATING_RATES]))
+    print(f"{'room':20} {'phases':>6} {'late':>8} {'early':>8}  current")
+    counts = np.bincount(phases.room, minlength=len(phases.rooms))
+    for i, room in enumerate(phases.rooms):
+        print(f"{room:20} {counts[i]:6d} {late[0, i]:8.0f} {early[0, i]:8.0f}  {tuple(HEATING_RATES.get(room, (0, 0, 0)))}")
+
+    if args.tables:
+        with open(args.tables) as f:
+            tables = json.load(f)
+        late, early = evaluate(phases, table_coeffs(phases, tables))
+        print(f"\n{'table':>5} {'late':>8} {'early':>8}")
+        for t in range(len(tables)):
+            print(f"{t:5d} {late[t].sum():8.0f} {early[t].sum():8.0f}")
+
+    if args.grid:
+        coeffs = grid_coeffs(phases, dict(_range(r) for r in args.grid))
+        late, early = evaluate(phases, coeffs)
+        best = np.argmin(args.late_weight*late + early, axis=0)
+        print(f"\n{'room':20} {'late':>8} {'early':>8}  best of {len(coeffs)}")
+        for i, room in enumerate(phases.rooms):
+            b = best[i]
+            print(f"{room:20} {late[b, i]:8.0f} {early[b, i]:8.0f}  {tuple(round(float(c), 4) for c in coeffs[b, i])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,11 +16,19 @@ ICON = "mdi:leaf"
 ENTITY = "entity"
 PLATFORMS = ["sensor"]
 
+# Services
+SERVICE_PROFILE = "profile"
+ATTR_CYCLES = "cycles"
+DEFAULT_PROFILE_CYCLES = 10
+
 # Defaults
 DEFAULT_NAME = DOMAIN
 MIN_TEMP = 0
 
 # Coefficients
+# (c0, c1, c2) per room: heating rate in degrees per hour, its gain per degree of flow above the room, and the
+# loss per degree above outside. The start temperature projection cools rooms at c2, so it has no effect until
+# c2 is fitted, and the start times of rooms with c2 = 0 still move as they cool.
 
 HEATING_RATES = {
     "Chrissie's study": (0.72,0,0),
@@ -39,3 +47,36 @@ HEATING_RATES = {
     "Utility room": (0.16, 0, 0),
     "Wet room UFH": (0.27, 0, 0)
 } 
+
+# Planning
+# Degrees by which a room may depart from its projected cooling before its start time is solved again.
+
+PROJECTION_TOLERANCE = 0.3
+
+# Degrees by which the flow and outside temperatures may move from those a start time was solved for before it is solved again.
+
+FLOW_TOLERANCE = 1.0
+OUTSIDE_TOLERANCE = 1.0
+
+# Rate of rise tracking while HEATING.
+# The estimate is fitted over the minutes for the room to rise RATE_RESOLUTION degrees at its expected rate, so that it
+# spans several of the 0.1 degree steps temperatures are reported in, kept within RATE_WINDOW and MAX_RATE_WINDOW minutes.
+# Progress is judged once a whole window has been measured. Heating is stalled at or below STALLED_FRACTION of the
+# expected rate, or STALLED_RATE (degrees per hour) for rooms without one. Arrival is late when projected beyond the schedule
+# change by more than LATE_MARGIN minutes plus LATE_FRACTION of the time left until it, as early projections are less certain.
+
+RATE_RESOLUTION = 0.5
+RATE_WINDOW = 30
+MAX_RATE_WINDOW = 240
+STALLED_FRACTION = 0.25
+STALLED_RATE = 0.1
+LATE_MARGIN = 10
+LATE_FRACTION = 0.15
+
+# House model
+# Conductances between adjacent rooms, in degrees per hour per degree of temperature difference.
+# Leave empty to treat every room as isolated, using the scalar heating_time model.
+
+ROOM_CONDUCTANCES = {
+#    ("Landing", "Hall"): 0.1,
+}
@@ -0,0 +1,239 @@
+"""The coordinator polling the Wiser rooms and heat pump, and planning warm-up for all rooms each cycle."""
+import cProfile
+import logging
+
+from datetime import datetime, timedelta
+
+import voluptuous as vol
+
+from homeassistant.helpers.update_coordinator import (
+    DataUpdateCoordinator,
+    UpdateFailed,
+)
+
+from .const import (
+    DOMAIN,
+    NAME,
+    HEATING_RATES,
+    ROOM_CONDUCTANCES,
+    ATTR_CYCLES,
+    DEFAULT_PROFILE_CYCLES
+)
+
+from .helpers import (
+    get_room_entities,
+    room_name_from_control_entity,
+    schedule_version_from_control_entity,
+    schedule_data_by_id,
+    string_to_date
+)
+
+from .engine import StartTimes
+
+from .schedule import WeeklySchedule
+
+from .thermal import HouseModel
+
+_LOGGER = logging.getLogger(__name__)
+
+SCAN_INTERVAL = timedelta(seconds=60)
+
+PROFILE_SCHEMA = vol.Schema(
+    {vol.Optional(ATTR_CYCLES, default=DEFAULT_PROFILE_CYCLES): vol.All(vol.Coerce(int), vol.Range(min=1))}
+)
+
+
+class HeatingAutomationCoordinator(DataUpdateCoordinator):
+
+    def __init__(self, hass, config):
+        self.platforms = []
+        self.hass = hass
+        self._rooms = get_room_entities(hass)
+        self._flow_temp = hass.data['sensor'].get_entity('sensor.panasonic_heat_pump_main_main_target_temp')
+        self._ambient_temp = hass.data['sensor'].get_entity('sensor.panasonic_heat_pump_main_outside_temp')
+        self._warmup = {}
+        self._start_times = StartTimes(HEATING_RATES)
+        self._schedules = {}
+        self._schedule_versions = {}
+        self._profiler = None
+        self._profile_cycles = 0
+        if ROOM_CONDUCTANCES:
+            self._house_model = HouseModel(
+                [room_name_from_control_entity(e) for e in self._rooms],
+                HEATING_RATES,
+                ROOM_CONDUCTANCES
+            )
+        else:
+            self._house_model = None
+        super().__init__(
+            hass,
+            _LOGGER,
+            name = NAME,
+            update_interval = SCAN_INTERVAL
+        )
+
+    def start_profiling(self, cycles):
+        """
+            Profile the next cycles, including the room entity updates, which run as listeners within the refresh.
+            The profile is written to the config directory and profiling switches itself off.
+            The room entity lookup in get_room_entities runs only once, when the coordinator is created, so it is not covered.
+        """
+        if self._profiler is not None:
+            _LOGGER.warning("Heating Automation profiling already running")
+            return
+        self._profiler = cProfile.Profile()
+        self._profile_cycles = cycles
+        _LOGGER.info("Heating Automation profiling the next %d cycles", cycles)
+
+    async def _async_refresh(self, *args, **kwargs):
+        profiler = self._profiler
+        if profiler is None:
+            await super()._async_refresh(*args, **kwargs)
+            return
+
+        try:
+            profiler.enable()
+        except ValueError as err:
+            _LOGGER.warning("Heating Automation profiling could not start: %s", err)
+            self._profiler = None
+            await super()._async_refresh(*args, **kwargs)
+            return
+        try:
+            await super()._async_refresh(*args, **kwargs)
+        finally:
+            profiler.disable()
+
+        self._profile_cycles -= 1
+        if self._profile_cycles <= 0:
+            self._profiler = None
+            path = self.hass.config.path(f"{DOMAIN}_{datetime.now():%Y%m%d_%H%M%S}.prof")
+            await self.hass.async_add_executor_job(profiler.dump_stats, path)
+            _LOGGER.info("Heating Automation profile written to %s", path)
+
+    async def _async_update_data(self):
+        _LOGGER.debug("Heating Automation polled")
+        self.refresh_schedules()
+        try:
+            flow = float(self.flow_temperature)
+            oat = float(self.outside_temperature)
+        except (TypeError, ValueError) as err:
+            raise UpdateFailed(f"Heat pump temperatures unavailable: {err}")
+        readings = self.room_readings()
+        if self._house_model is not None:
+            self._warmup = self.coupled_warmup(readings, flow, oat)
+        else:
+            self._warmup = self.projected_warmup(readings, flow, oat)
+        return True
+
+    def refresh_schedules(self):
+        """
+            Keep a cached weekly schedule per room, read from the Wiser hub only when the room's schedule version changes.
+            The version is the schedule id and next change in the Wiser entity's attributes. A new next change that the cached
+            schedule already predicts is just the schedule stepping on, so the data is read again only for a different schedule
+            or an unexpected next change, which is an edit.
+            Rooms without readable schedule data fall back to the next schedule attributes of the Wiser entity.
+        """
+        now = datetime.now()
+        for e in self._rooms:
+            version = schedule_version_from_control_entity(e)
+            previous = self._schedule_versions.get(e.entity_id)
+            if version == previous:
+                continue
+            self._schedule_versions[e.entity_id] = version
+            schedule_id, next_change = version
+            cached = self._schedules.get(e.entity_id)
+            if cached is not None and previous is not None and previous[0] == schedule_id and next_change is not None:
+                predicted = [when for when, _ in cached.upcoming(now - SCAN_INTERVAL, 2)]
+                if string_to_date(next_change) in predicted:
+                    continue
+            data = schedule_data_by_id(self.hass, schedule_id)
+            if not data:
+                """Not readable yet, perhaps as the Wiser hub is still loading, so try again on the next cycle."""
+                self._schedules.pop(e.entity_id, None)
+                self._schedule_versions.pop(e.entity_id, None)
+            else:
+                _LOGGER.debug("Schedule loaded for %s", e.entity_id)
+                self._schedules[e.entity_id] = WeeklySchedule(data)
+
+    def upcoming_transitions(self, room, count=1):
+        """
+            The next count (datetime, setpoint) schedule transitions for the Wiser room entity.
+            Returns None if no cached schedule is available.
+        """
+        schedule = self._schedules.get(room.entity_id)
+        if schedule is None or len(schedule) == 0:
+            return None
+        return schedule.upcoming(datetime.now(), count)
+
+    def room_readings(self):
+        """The (current temperature, target, next schedule change, next setpoint) of each room, keyed by room name."""
+        readings = {}
+        for e in self._rooms:
+            target = e.target_temperature if e.target_temperature is not None else e.min_temp
+            transitions = self.upcoming_transitions(e)
+            if transitions is None:
+                attrs = e.extra_state_attributes
+                next_change = string_to_date(attrs.get("next_schedule_datetime", datetime.now()+timedelta(days=36)))
+                next_target = attrs.get("next_schedule_temp", target)
+            else:
+                next_change, next_target = transitions[0]
+            readings[room_name_from_control_entity(e)] = (e.current_temperature, target, next_change, next_target)
+        return readings
+
+    def coupled_warmup(self, readings, flow, oat):
+        """
+            Warm-up minutes for the rooms with a rise to come, from the coupled house model, solved together so that rooms
+            heating at the same time warm their neighbours. Every room starts at its measured temperature and is held by
+            the controller at its current target; rooms below it heat now, and rooms with a rise start heating in time for it.
+        """
+        now = datetime.now()
+        curr = {}
+        floors = {}
+        targets = {}
+        leads = {}
+        for name, (temperature, target, next_change, next_target) in readings.items():
+            curr[name] = temperature if temperature is not None else target
+            floors[name] = target
+            if temperature is None:
+                continue
+            if next_target > target and next_target > temperature:
+                targets[name] = next_target
+                leads[name] = (next_change - now).total_seconds()/60
+            elif target > temperature:
+                targets[name] = target
+        warmup = self._house_model.warmup_minutes(curr, targets, flow, oat, leads, floors)
+        return {name: warmup[name] for name in leads}
+
+    def projected_warmup(self, readings, flow, oat):
+        """
+            Preheat minutes for the rooms with a rise to come, from the temperature each is projected to have cooled to
+            when heating starts, solved for all rooms in one batch and kept until the plan changes.
+        """
+        rises = {
+            name: (temperature, next_change, next_target)
+            for name, (temperature, target, next_change, next_target) in readings.items()
+            if temperature is not None and next_target > target and next_target > temperature
+        }
+        return self._start_times.preheat(datetime.now(), rises, flow, oat)
+
+    def warmup_time(self, room_name):
+        """Planned warm-up minutes for the next rise of the room, or None to use the scalar heating time from now."""
+        return self._warmup.get(room_name)
+
+    def start_temperature(self, room_name):
+        """The temperature the room is projected to start heating from, or None if not projected."""
+        if self._house_model is not None:
+            return None
+        return self._start_times.start_temperature(room_name)
+
+    @property 
+    def rooms(self):
+        return self._rooms
+    
+    @property
+    def flow_temperature(self):
+        return self._flow_temp.state
+        
+    @property    
+    def outside_temperature(self):
+        return self._ambient_temp.state
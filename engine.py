@@ -0,0 +1,341 @@
+"""
+    The room planning engine, independent of Home Assistant.
+    It is driven by the AutomationRoom sensors inside Home Assistant, and by the headless planner.
+"""
+from collections import namedtuple
+from datetime import timedelta
+import logging
+import math
+
+from .const import (
+    HEATING_RATES,
+    RATE_RESOLUTION,
+    RATE_WINDOW,
+    MAX_RATE_WINDOW,
+    STALLED_FRACTION,
+    STALLED_RATE,
+    LATE_MARGIN,
+    LATE_FRACTION,
+    PROJECTION_TOLERANCE,
+    FLOW_TOLERANCE,
+    OUTSIDE_TOLERANCE
+)
+
+from .thermal import heating_time, heating_rate, solve_start_times, RiseRateEstimator
+
+_LOGGER = logging.getLogger(__name__)
+
+"""
+    The possible states of the automation.
+        HOLDING     the target temperature has been achieved and the underlying heting controller maintains it.
+        COOLING     the underlying controller is not expected to call for heat, as the room is cooling to the target.
+        HEATING     the schedule has been advanced so that the target temperature will be met at the scheduled time.
+"""
+
+HEATING = 3
+COOLING = 1
+HOLDING = 2
+
+"""
+    Progress of a HEATING phase, from the measured rate of rise.
+        ON_TRACK    projected to reach the target by the schedule change.
+        LATE        projected to reach the target after the schedule change.
+        STALLED     the temperature is not rising.
+"""
+
+ON_TRACK = "on track"
+LATE = "late"
+STALLED = "stalled"
+
+"""Actions requested of the underlying controller, or raised for attention."""
+
+ADVANCE_SCHEDULE = "Advance Schedule"
+CANCEL_OVERRIDES = "Cancel Overrides"
+
+
+def preheat_time(room, curr_temp, curr_target, next_target, flow, oat, rates=HEATING_RATES, warmup=None):
+    """
+        Minutes of heating needed ahead of the next schedule change to reach its setpoint.
+        warmup, if given, is the time to the next setpoint from a coupled model, used in place of the scalar heating_time.
+
+        Only the next setpoint is planned for. An Advance Schedule moves the controller to that setpoint alone, so the
+        room holds it once there, and starting earlier for a rise that follows closely would gain nothing.
+    """
+    if next_target == curr_target:
+        return 0
+
+    heat_delay = warmup
+    if heat_delay is None:
+        heat_delay = heating_time(room, curr_temp, next_target, flow, oat, rates)
+    return int(heat_delay+0.5)
+
+
+_StartPlan = namedtuple("_StartPlan", ["next_change", "next_target", "solved_at", "solved_temp", "flow", "oat", "preheat", "start_temp"])
+
+
+class StartTimes:
+    """
+        Preheat for the next rise of each room, allowing for the room cooling until heating starts.
+        Rooms are solved together in one batch, and a solution is kept until the room's next change or setpoint moves,
+        the flow or outside temperature moves from those it was solved for, or the room departs from its projected cooling,
+        so that the start time stays put rather than drifting later on every cycle as the room cools.
+    """
+
+    def __init__(self, rates=HEATING_RATES):
+        self.rates = rates
+        self._plans = {}
+        uncooled = sorted(room for room, coeffs in rates.items() if coeffs[2] <= 0)
+        if uncooled:
+            _LOGGER.warning(
+                "No cooling coefficient (c2) for %s: their start temperatures are not projected, "
+                "so their start times are solved again as they cool",
+                ", ".join(uncooled)
+            )
+
+    def preheat(self, now, rises, flow, oat):
+        """
+            rises maps room names to (current temperature, next change, next setpoint) for rooms with a rise to plan.
+            Returns the preheat minutes for each, as a dict.
+        """
+        self._plans = {room: plan for room, plan in self._plans.items() if room in rises}
+        stale = []
+        for room, (curr, next_change, next_target) in rises.items():
+            plan = self._plans.get(room)
+            if (
+                    plan is None or plan.next_change != next_change or plan.next_target != next_target or
+                    abs(flow - plan.flow) > FLOW_TOLERANCE or abs(oat - plan.oat) > OUTSIDE_TOLERANCE
+                ):
+                stale.append(room)
+                continue
+            loss = self.rates.get(room, (0, 0, 0))[2]
+            minutes = (now - plan.solved_at).total_seconds()/60
+            projected = oat + (plan.solved_temp - oat)*math.exp(-loss*minutes/60)
+            if abs(curr - projected) > PROJECTION_TOLERANCE:
+                stale.append(room)
+
+        if stale:
+            preheat, start_temp = solve_start_times(
+                [self.rates.get(room, (0, 0, 0)) for room in stale],
+                [rises[room][0] for room in stale],
+                [rises[room][2] for room in stale],
+                [(rises[room][1] - now).total_seconds()/60 for room in stale],
+                flow,
+                oat
+            )
+            for i, room in enumerate(stale):
+                curr, next_change, next_target = rises[room]
+                self._plans[room] = _StartPlan(next_change, next_target, now, curr, flow, oat, float(preheat[i]), float(start_temp[i]))
+
+        return {room: plan.preheat for room, plan in self._plans.items()}
+
+    def start_temperature(self, room):
+        """The temperature the room is projected to start heating from, or None if it has no plan."""
+        plan = self._plans.get(room)
+        return plan.start_temp if plan is not None else None
+
+
+def rate_window(expected_rate):
+    """The window of the rate of rise estimate, long enough to span RATE_RESOLUTION degrees at the expected rate."""
+    if not expected_rate:
+        return timedelta(minutes = RATE_WINDOW)
+    return timedelta(minutes = min(max(RATE_RESOLUTION/expected_rate*60, RATE_WINDOW), MAX_RATE_WINDOW))
+
+
+class RoomPlanner:
+    """
+        The control state of one room, with the session logging data for later analysis.
+        statistics, if given, receives the planned preheat, prediction errors and a sample on every update.
+        room and rates give the rate of rise expected while HEATING, against which a measured rate is judged stalled.
+    """
+
+    def __init__(self, next_schedule_change, current_target, statistics=None, room=None, rates=HEATING_RATES):
+        self.room = room
+        self.rates = rates
+        self.control_state = HOLDING
+        self.next_schedule_change = next_schedule_change
+        self.current_target = current_target
+        self.ontime = None
+        self.ontemp = None
+        self.offtime = None
+        self.offtemp = None
+        self.flow_temp = None
+        self.ambient_temp = None
+        self.rise_rate = RiseRateEstimator(rate_window(None))
+        self.expected_rate = None
+        self.heating_status = None
+        self.heating_raised = False
+        self.projected_arrival = None
+        self.planned_preheat = None
+        self.statistics = statistics
+
+    def log_phase_end(self, now, curr_temp, flow, oat, arrived=False):
+        """
+            arrived is set when the phase ends by reaching its target. Only then is the duration of a HEATING phase
+            an arrival time, to be recorded against the planned preheat; phases cut short by user changes are not.
+        """
+        self.offtime = now
+        if self.control_state == HEATING and arrived and self.planned_preheat is not None:
+            actual = (self.offtime - self.ontime).total_seconds()/60
+            if self.statistics is not None:
+                self.statistics.prediction_error(actual - self.planned_preheat)
+        self.planned_preheat = None
+        self.heating_status = None
+        self.projected_arrival = None
+        self.offtemp = curr_temp
+        if self.flow_temp is None:
+            self.flow_temp = flow
+        else:
+            self.flow_temp = (self.flow_temp + flow)/2
+        if self.ambient_temp is None:
+            self.ambient_temp = oat
+        else:
+            self.ambient_temp = (self.ambient_temp + oat)/2
+
+    def log_phase_start(self, now, curr_temp, flow, oat):
+        """
+            The off time and temperature are not reset because a phase start may immdiately follow a phase end,
+            which would overwrite the logged off values. In processing them, we may have to associate te off values with the previous on values.
+            The alternative would be to separate off and on across update cycles, going via HOLDING, which would provide at least a small window for the
+            off values.
+        """
+        self.ontime = now
+        self.ontemp = curr_temp
+        self.flow_temp = flow
+        self.ambient_temp = oat
+        self.rise_rate.reset()
+        self.heating_status = None
+        self.heating_raised = False
+        self.projected_arrival = None
+
+    def track_heating(self, now, curr_temp):
+        """
+            Re-project the arrival time of a HEATING phase from the measured rate of rise on every cycle.
+            Returns the status when the phase becomes late or stalled, so that it can be acted on before the schedule change.
+            Only the first time the phase goes wrong is raised, as noisy temperatures can flip the status back and forth.
+        """
+        self.rise_rate.add(now, curr_temp)
+        rate = self.rise_rate.rate
+        if not self.rise_rate.complete or rate is None or curr_temp is None:
+            return None
+
+        stalled = STALLED_RATE if self.expected_rate is None else STALLED_FRACTION*self.expected_rate
+        if rate <= stalled:
+            status = STALLED
+            self.projected_arrival = None
+        else:
+            self.projected_arrival = now + timedelta(hours = max(0, self.current_target - self.rise_rate.temperature)/rate)
+            margin = timedelta(minutes = LATE_MARGIN) + LATE_FRACTION*max(self.next_schedule_change - now, timedelta(0))
+            if self.projected_arrival > self.next_schedule_change + margin:
+                status = LATE
+            else:
+                status = ON_TRACK
+
+        self.heating_status = status
+        if status != ON_TRACK and not self.heating_raised:
+            self.heating_raised = True
+            return status
+        return None
+
+    def update(self, now, curr_temp, curr_target, next_sched_change, next_target, flow, oat, heat_delay):
+        """
+            Handles periodic updates to the heating automation state for the room, returning the list of actions raised.
+            heat_delay is the planned preheat in minutes for the next schedule change.
+            Assumes a system without cooling capability, where the schedule is set to give comfortable
+            temperatures when the rooms are expected to be occupied, and set back when they are not.
+            Hence heating is triggered in advance of a schedule change to allow the room to warm up.
+            Cooling is passive in the set back periods, and tracked only to gather thermal performance data.
+
+            The conditions are not mutually exclusive, but the code deals with only one on each cycle.
+        """
+        actions = []
+        ontime = next_sched_change - timedelta(minutes = heat_delay)
+
+        if self.next_schedule_change < now:
+            """
+                Passed the expected schedule change time. (A user schedule change may mean that this is not the actual one.)
+                Log the end of an active phase, and start a new COOLING phase if necessary
+            """
+            if self.control_state != HOLDING:
+                self.log_phase_end(now, curr_temp, flow, oat)
+                self.control_state = HOLDING
+
+            if curr_temp > curr_target:
+                self.log_phase_start(now, curr_temp, flow, oat)
+                self.control_state = COOLING
+
+            self.next_schedule_change = next_sched_change
+            self.current_target = curr_target
+
+        elif self.next_schedule_change != next_sched_change:
+            """
+                A user change in the schedule affecting the next schedule change.
+                The previous case ensures that these events are in the future but we may have used the previous value to
+                move to the HEATING state. In this case, we reset to HOLDING, cancel the override, and let the
+                planning resume on the next call.
+            """
+            if self.next_schedule_change < now:
+                _LOGGER.warning("Assertion that next schedule change is in future violated")
+            if self.control_state == HEATING:
+                self.log_phase_end(now, curr_temp, flow, oat)
+                self.control_state = HOLDING
+                actions.append(CANCEL_OVERRIDES)
+
+            self.next_schedule_change = next_sched_change
+
+        elif  (
+                (self.control_state == HEATING and curr_temp >= curr_target) or
+                (self.control_state == COOLING and curr_temp <= curr_target)
+            ):
+            """
+                End an active phase when the current target temperature is reached.
+                The target can be changed by entering the HEATING state (Advance Schedule), or by the user. Schedule steps are already accounted for.
+                If the user raises the target above the current temperature, the underlying controller will provide heat (HOLDING state).
+                User changes may result in re-entry to the HEATING state on the next cycle, if the planning time is passed.
+            """
+            self.log_phase_end(now, curr_temp, flow, oat, arrived=True)
+            self.current_target = curr_target
+            self.control_state = HOLDING
+
+        elif self.current_target != curr_target:
+            """
+                The user has changed the target temperature (since schedule steps are already dealt with).
+                HOLDING needs no action - we contine to hold.
+                COOLING needs no action, as the previous condition ensures the target temperature is lower than current.
+                HEATING is effectively terminated, so we go to HOLDING (and replan on the next cycle)
+            """
+            if self.control_state == HEATING:
+                self.log_phase_end(now, curr_temp, flow, oat)
+                self.control_state = HOLDING
+
+            if self.control_state == COOLING and curr_temp <= curr_target:
+                _LOGGER.warning("Assertion that continued COOLING requires current temperature above target violated")
+
+            self.current_target = curr_target
+
+        elif ontime < now and self.control_state != HEATING:
+            """
+                Planned schedule advance time has been reached.
+                An advance already in progress is not repeated, which would restart the phase on every cycle.
+            """
+
+            if self.control_state != HOLDING:
+                self.log_phase_end(now, curr_temp, flow, oat)
+            self.log_phase_start(now, curr_temp, flow, oat)
+            self.planned_preheat = heat_delay
+            if self.statistics is not None:
+                self.statistics.preheat_planned(heat_delay)
+            self.current_target = next_target
+            self.expected_rate = heating_rate(self.room, curr_temp, next_target, flow, oat, self.rates)
+            self.rise_rate.window = rate_window(self.expected_rate)
+            actions.append(ADVANCE_SCHEDULE)
+            self.control_state = HEATING
+
+        if self.control_state == HEATING:
+            status = self.track_heating(now, curr_temp)
+            if status is not None:
+                actions.append("Heating " + status.capitalize())
+
+        if self.statistics is not None:
+            self.statistics.sample(self.control_state == HEATING, self.control_state == COOLING, flow, oat)
+
+        return actions
@@ -2,6 +2,7 @@ from datetime import date, time, datetime, timedelta
 from custom_components.wiser.const import DOMAIN, ENTITY_PREFIX
 
 from .const import HEATING_RATES, CONTROLNAME
+from .thermal import heating_time
 
 def get_room_entities(hass):
     return [e for e in hass.data.get('climate').entities if DOMAIN in e.entity_id and room_name_from_control_entity(e) in HEATING_RATES]
@@ -9,24 +10,24 @@ def get_room_entities(hass):
 def room_name_from_control_entity(e):
     return e.name.replace(CONTROLNAME,'').strip()
 
+def schedule_version_from_control_entity(e):
+    """The schedule id and next change reported in the Wiser entity's state attributes, which move when its schedule does."""
+    attrs = e.extra_state_attributes or {}
+    return attrs.get("schedule_id"), attrs.get("next_schedule_datetime")
+
+def schedule_data_by_id(hass, schedule_id):
+    """The schedule_data of a schedule from the public schedules collection of the Wiser hubs, or None."""
+    if schedule_id is None:
+        return None
+    for entry in hass.data.get(DOMAIN, {}).values():
+        coordinator = entry.get("data") if isinstance(entry, dict) else None
+        schedules = getattr(getattr(coordinator, "wiserhub", None), "schedules", None)
+        schedule = schedules.get_by_id(schedule_id) if schedules is not None else None
+        if schedule is not None:
+            return schedule.schedule_data
+    return None
+
 def string_to_date(s):
+    if isinstance(s, datetime):
+        return s
     return datetime.strptime(s, '%Y-%m-%d %H:%M:%S')
-    
-def heating_time(room, curr, target, flow, oat):
-    mid = (curr + target)/2
-    gain = target - curr
-    hf = flow - mid
-    cf = mid - oat
-    if gain > 0:
-        if hf > 0 and room in HEATING_RATES:
-            coeffs = HEATING_RATES[room]
-            heatdelay = (gain / (coeffs[0] + coeffs[1]*hf - coeffs[2]*cf)) * 60
-        else:
-            heatdelay = 0
-    elif gain < 0 and cf > 0 and room in HEATING_RATES:
-        coeffs = HEATING_RATES[room]
-        heatdelay = (coeffs[0] + coeffs[2]*cf) * gain * 60
-    else:
-        heatdelay = 0
-    
-    return heatdelay
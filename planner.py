@@ -0,0 +1,262 @@
+"""
+    Headless planner, running the room planning engine outside Home Assistant from a JSON lines feed.
+
+        python -m heating_automation.planner [--listen HOST:PORT] [--interval SECONDS]
+
+    Each input line is a JSON object with a "type":
+        site        {"site", "rates": {room: [c0, c1, c2]}, "conductances": [[room, room, g], ...]}
+                    optional, the coefficients default to those in const.
+        heat_pump   {"site", "flow", "outside"}
+        schedule    {"site", "room", "schedule"}, the schedule in the Wiser schedule_data format.
+        room        {"site", "room", "temperature", "target"}, the target defaulting to the scheduled setpoint,
+                    or to the advanced one from an advance until the scheduled change.
+        tick        {"site", "time"}, plans one site, or all sites without "site", at the ISO time or now.
+    Each decision is written as a JSON line {"site", "room", "action", "time"}.
+
+    Without --listen the feed is read from stdin and decisions are written to stdout. With --listen every
+    connection is a separate feed, and its decisions are written back on the same connection, so a local
+    broker stand-in can drive many sites through one process. With --interval, every feed is also planned
+    periodically at the current time, as the coordinator does in Home Assistant.
+"""
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import logging
+import sys
+
+from .const import HEATING_RATES, ROOM_CONDUCTANCES
+from .engine import ADVANCE_SCHEDULE, CANCEL_OVERRIDES, RoomPlanner, StartTimes, preheat_time
+from .schedule import WeeklySchedule
+from .thermal import HouseModel
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PlannedRoom:
+    def __init__(self):
+        self.schedule = None
+        self.temperature = None
+        self.target = None
+        self.planner = None
+        self.advanced = None
+
+
+class Site:
+    """The rooms and heat pump readings of one site, planned together as the coordinator plans a house."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rooms = {}
+        self.flow = None
+        self.outside = None
+        self.rates = HEATING_RATES
+        self.conductances = ROOM_CONDUCTANCES
+        self._model = None
+        self._start_times = StartTimes(self.rates)
+
+    def configure(self, rates=None, conductances=None):
+        if rates is not None:
+            self.rates = {room: tuple(coeffs) for room, coeffs in rates.items()}
+        if conductances is not None:
+            self.conductances = {(a, b): g for a, b, g in conductances}
+        self._model = None
+        self._start_times = StartTimes(self.rates)
+
+    def room(self, name):
+        if name not in self.rooms:
+            self.rooms[name] = PlannedRoom()
+            self._model = None
+        return self.rooms[name]
+
+    def _warmup(self, ready, targets, now):
+        """
+            Warm-up minutes for the ready rooms with a rise to come, from the coupled model if the site has conductances,
+            and otherwise from the start times projected for the rooms with a rise to come.
+        """
+        if not self.conductances:
+            rises = {}
+            for name, room in ready.items():
+                next_change, next_target = room.schedule.upcoming(now)[0]
+                if next_target > targets[name] and next_target > room.temperature:
+                    rises[name] = (room.temperature, next_change, next_target)
+            return self._start_times.preheat(now, rises, self.flow, self.outside)
+        if self._model is None or self._model.rooms != list(ready):
+            self._model = HouseModel(ready, self.rates, self.conductances)
+        curr = {}
+        next_targets = {}
+        leads = {}
+        for name, room in ready.items():
+            curr[name] = room.temperature
+            next_change, next_target = room.schedule.upcoming(now)[0]
+            if next_target > targets[name] and next_target > room.temperature:
+                next_targets[name] = next_target
+                leads[name] = (next_change - now).total_seconds()/60
+            elif targets[name] > room.temperature:
+                next_targets[name] = targets[name]
+        warmup = self._model.warmup_minutes(curr, next_targets, self.flow, self.outside, leads, targets)
+        return {name: warmup[name] for name in leads}
+
+    def _target(self, room, now):
+        """
+            The room's target from the feed, or else the setpoint the controller holds: the scheduled one,
+            or the next one from when the planner advances the schedule to it until its scheduled change.
+        """
+        if room.target is not None:
+            return room.target
+        if room.advanced is not None:
+            change, target = room.advanced
+            if now < change:
+                return target
+            room.advanced = None
+        return room.schedule.current(now)
+
+    def plan(self, now):
+        """Update every room with complete readings, returning the actions raised as (room, action)."""
+        if self.flow is None or self.outside is None:
+            return []
+        ready = {
+            name: room for name, room in self.rooms.items()
+            if room.temperature is not None and room.schedule is not None and len(room.schedule) > 0
+        }
+        targets = {name: self._target(room, now) for name, room in ready.items()}
+        warmup = self._warmup(ready, targets, now)
+
+        decisions = []
+        for name, room in ready.items():
+            next_change, next_target = room.schedule.upcoming(now)[0]
+            heat_delay = preheat_time(
+                name, room.temperature, targets[name], next_target, self.flow, self.outside, self.rates, warmup.get(name)
+            )
+            if room.planner is None:
+                room.planner = RoomPlanner(next_change, targets[name], room=name, rates=self.rates)
+            actions = room.planner.update(
+                now, room.temperature, targets[name], next_change, next_target, self.flow, self.outside, heat_delay
+            )
+            if ADVANCE_SCHEDULE in actions:
+                room.advanced = (next_change, next_target)
+            elif CANCEL_OVERRIDES in actions:
+                room.advanced = None
+            decisions.extend((name, action) for action in actions)
+        return decisions
+
+
+class Feed:
+    """One JSON lines feed of readings, and the sites it describes."""
+
+    def __init__(self, publish):
+        self.sites = {}
+        self._publish = publish
+
+    def site(self, name):
+        if name not in self.sites:
+            self.sites[name] = Site(name)
+        return self.sites[name]
+
+    async def plan(self, now, site=None):
+        sites = self.sites.values() if site is None else [self.site(site)]
+        for s in sites:
+            for room, action in s.plan(now):
+                await self._publish({"site": s.name, "room": room, "action": action, "time": now.isoformat()})
+
+    async def handle(self, message):
+        kind = message.get("type")
+        if kind == "tick":
+            now = datetime.fromisoformat(message["time"]) if "time" in message else datetime.now()
+            await self.plan(now, message.get("site"))
+            return
+
+        site = self.site(message["site"])
+        if kind == "site":
+            site.configure(message.get("rates"), message.get("conductances"))
+        elif kind == "heat_pump":
+            site.flow = float(message["flow"])
+            site.outside = float(message["outside"])
+        elif kind == "schedule":
+            room = site.room(message["room"])
+            if room.schedule is None or room.schedule.source != message["schedule"]:
+                room.schedule = WeeklySchedule(message["schedule"])
+        elif kind == "room":
+            room = site.room(message["room"])
+            room.temperature = float(message["temperature"])
+            room.target = float(message["target"]) if message.get("target") is not None else None
+        else:
+            _LOGGER.warning("Unknown message type %s", kind)
+
+    async def run(self, reader, interval=None):
+        ticker = asyncio.create_task(self._tick(interval)) if interval else None
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise TypeError(f"expected an object, not {type(message).__name__}")
+                    await self.handle(message)
+                except (ValueError, KeyError, TypeError) as err:
+                    _LOGGER.warning("Ignored feed line %r: %s", line[:200], err)
+        finally:
+            if ticker is not None:
+                ticker.cancel()
+
+    async def _tick(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.plan(datetime.now())
+            except Exception:
+                _LOGGER.exception("Periodic planning failed")
+
+
+class _StdinReader:
+    """Reads stdin lines in the executor, so that redirected files work as well as pipes."""
+
+    async def readline(self):
+        return await asyncio.get_running_loop().run_in_executor(None, sys.stdin.buffer.readline)
+
+
+async def _run_stdio(interval):
+    reader = _StdinReader()
+
+    async def publish(decision):
+        sys.stdout.write(json.dumps(decision) + "\n")
+        sys.stdout.flush()
+
+    await Feed(publish).run(reader, interval)
+
+
+async def _run_server(host, port, interval):
+    async def connection(reader, writer):
+        async def publish(decision):
+            writer.write((json.dumps(decision) + "\n").encode())
+            await writer.drain()
+
+        try:
+            await Feed(publish).run(reader, interval)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(connection, host, port)
+    _LOGGER.info("Planner listening on %s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m heating_automation.planner", description="Headless heating planner.")
+    parser.add_argument("--listen", metavar="HOST:PORT", help="serve feeds over TCP instead of stdin and stdout")
+    parser.add_argument("--interval", type=float, help="also plan every feed every INTERVAL seconds")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), stream=sys.stderr)
+
+    if args.listen:
+        host, _, port = args.listen.rpartition(":")
+        asyncio.run(_run_server(host or "127.0.0.1", int(port), args.interval))
+    else:
+        asyncio.run(_run_stdio(args.interval))
+
+
+if __name__ == "__main__":
+    main()
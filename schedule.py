@@ -0,0 +1,83 @@
+"""Weekly heating schedules cached as sorted arrays of setpoint transitions."""
+from array import array
+from bisect import bisect_left, bisect_right
+from copy import deepcopy
+from datetime import datetime, timedelta
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DAY_GROUPS = {
+    "Weekdays": DAYS[:5],
+    "Weekends": DAYS[5:],
+    "Everyday": DAYS,
+    "Every Day": DAYS,
+}
+MINUTES_PER_DAY = 24*60
+MINUTES_PER_WEEK = 7*MINUTES_PER_DAY
+
+
+def _minute_of_day(t):
+    if isinstance(t, str):
+        hours, minutes = t.split(":")[:2]
+        return int(hours)*60 + int(minutes)
+    # Wiser also uses integer HHMM times.
+    return (int(t)//100)*60 + int(t) % 100
+
+
+class WeeklySchedule:
+    """
+        A room's weekly schedule, as the Wiser schedule_data dictionary
+            {"Monday": [{"Time": "06:30", "Temp": 20.0}, ...], ...}
+        held as parallel arrays of minute of the week and setpoint, sorted by time.
+        Consecutive entries with the same setpoint are merged, so every transition is a setpoint change.
+        Lookups are binary searches, so no schedule data needs to be re-read between schedule changes.
+    """
+
+    def __init__(self, schedule_data):
+        self.source = deepcopy(schedule_data)
+        setpoints = {}
+        for key, entries in schedule_data.items():
+            days = DAY_GROUPS.get(key, [key] if key in DAYS else [])
+            if not isinstance(entries, list):
+                continue
+            for day in days:
+                offset = DAYS.index(day)*MINUTES_PER_DAY
+                for entry in entries:
+                    if "Time" in entry and "Temp" in entry:
+                        setpoints[offset + _minute_of_day(entry["Time"])] = float(entry["Temp"])
+
+        minutes = sorted(setpoints)
+        self._minutes = array("l")
+        self._temps = array("d")
+        for i, m in enumerate(minutes):
+            if setpoints[m] != setpoints[minutes[i - 1]] or len(minutes) == 1:
+                self._minutes.append(m)
+                self._temps.append(setpoints[m])
+
+    def __len__(self):
+        return len(self._minutes)
+
+    def upcoming(self, now, count=1):
+        """
+            The next count transitions after now, as (datetime, setpoint), wrapping round the week.
+            A transition at exactly now is still upcoming, so that it is seen to pass only once now is later.
+        """
+        n = len(self._minutes)
+        if n == 0:
+            return []
+        week_start = datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+        now_minute = (now - week_start).total_seconds()/60
+        i = bisect_left(self._minutes, now_minute)
+        transitions = []
+        for k in range(i, i + count):
+            weeks, j = divmod(k, n)
+            when = week_start + timedelta(minutes=self._minutes[j] + weeks*MINUTES_PER_WEEK)
+            transitions.append((when, self._temps[j]))
+        return transitions
+
+    def current(self, now):
+        """The setpoint in force at now."""
+        if len(self._minutes) == 0:
+            return None
+        week_start = datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+        i = bisect_right(self._minutes, (now - week_start).total_seconds()/60)
+        return self._temps[i - 1]
@@ -0,0 +1,126 @@
+"""Hourly long-term statistics of room heating, published through the recorder's external statistics."""
+from datetime import timedelta
+import logging
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfTemperature, UnitOfTime
+from homeassistant.util import dt as dt_util
+from homeassistant.util import slugify
+
+from .const import DOMAIN, NAME
+
+_LOGGER = logging.getLogger(__name__)
+
+"""
+    The statistics kept for each room, as (key, name, unit, has_sum).
+    Summed statistics are minutes per hour; the others are means over the hour.
+        preheat_planned     minutes of preheat planned when heating was advanced.
+        heating_minutes     minutes spent in the HEATING state.
+        cooling_minutes     minutes spent in the COOLING state.
+        flow_temperature    heat pump flow temperature while HEATING or COOLING.
+        ambient_temperature outside temperature while HEATING or COOLING.
+        prediction_error    actual less planned preheat minutes, for HEATING phases that reached their target.
+"""
+
+STATISTICS = (
+    ("preheat_planned", "preheat planned", UnitOfTime.MINUTES, True),
+    ("heating_minutes", "heating", UnitOfTime.MINUTES, True),
+    ("cooling_minutes", "cooling", UnitOfTime.MINUTES, True),
+    ("flow_temperature", "flow temperature", UnitOfTemperature.CELSIUS, False),
+    ("ambient_temperature", "ambient temperature", UnitOfTemperature.CELSIUS, False),
+    ("prediction_error", "prediction error", UnitOfTime.MINUTES, False),
+)
+
+"""Gaps between samples longer than this (restarts, missed cycles) are not counted as time in a state."""
+MAX_SAMPLE_GAP = timedelta(minutes=5)
+
+
+class RoomStatistics:
+    """
+        Accumulates one room's heating over the current hour, and publishes the hour as external statistics
+        when the next one starts. Each statistic is one row per hour, so season-long queries stay small.
+    """
+
+    def __init__(self, hass, room_name):
+        self.hass = hass
+        self.room_name = room_name
+        self._ids = {key: f"{DOMAIN}:{slugify(room_name)}_{key}" for key, _, _, _ in STATISTICS}
+        self._sums = None
+        self._hour = None
+        self._last_sample = None
+        self._reset()
+
+    def _reset(self):
+        self._values = {key: [] for key, _, _, has_sum in STATISTICS if not has_sum}
+        self._totals = {key: 0.0 for key, _, _, has_sum in STATISTICS if has_sum}
+
+    def preheat_planned(self, minutes):
+        self._totals["preheat_planned"] += minutes
+
+    def prediction_error(self, minutes):
+        self._values["prediction_error"].append(minutes)
+
+    def sample(self, heating, cooling, flow, ambient):
+        """Record the room state for the time since the previous sample, publishing the previous hour when it has ended."""
+        now = dt_util.utcnow()
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        if self._hour is not None and hour != self._hour:
+            self.hass.async_create_task(self._async_publish(self._hour, self._totals, self._values))
+            self._reset()
+        self._hour = hour
+
+        if self._last_sample is not None and now - self._last_sample <= MAX_SAMPLE_GAP:
+            minutes = (now - self._last_sample).total_seconds()/60
+            if heating:
+                self._totals["heating_minutes"] += minutes
+            if cooling:
+                self._totals["cooling_minutes"] += minutes
+        self._last_sample = now
+
+        if heating or cooling:
+            self._values["flow_temperature"].append(flow)
+            self._values["ambient_temperature"].append(ambient)
+
+    async def _async_load_sums(self):
+        """The running sums continue from the last published hour of each summed statistic."""
+        sums = {}
+        for key, _, _, has_sum in STATISTICS:
+            if has_sum:
+                last = await get_instance(self.hass).async_add_executor_job(
+                    get_last_statistics, self.hass, 1, self._ids[key], True, {"sum"}
+                )
+                rows = last.get(self._ids[key])
+                sums[key] = (rows[0].get("sum") or 0.0) if rows else 0.0
+        return sums
+
+    async def _async_publish(self, hour, totals, values):
+        if self._sums is None:
+            self._sums = await self._async_load_sums()
+
+        for key, name, unit, has_sum in STATISTICS:
+            metadata = {
+                "has_mean": not has_sum,
+                "has_sum": has_sum,
+                "name": f"{NAME} {self.room_name} {name}",
+                "source": DOMAIN,
+                "statistic_id": self._ids[key],
+                "unit_of_measurement": unit,
+            }
+            if has_sum:
+                self._sums[key] += totals[key]
+                row = {"start": hour, "state": totals[key], "sum": self._sums[key]}
+            elif values[key]:
+                row = {
+                    "start": hour,
+                    "mean": sum(values[key])/len(values[key]),
+                    "min": min(values[key]),
+                    "max": max(values[key]),
+                }
+            else:
+                continue
+            async_add_external_statistics(self.hass, metadata, [row])
+        _LOGGER.debug("Statistics published for %s at %s", self.room_name, hour)
@@ -0,0 +1,48 @@
+"""Tests of the vectorised backtest against the scalar heating_time."""
+import json
+
+import numpy as np
+import pytest
+
+from ..backtest import evaluate, grid_coeffs, load_phases, table_coeffs
+from ..thermal import heating_time
+
+PHASES = [
+    {"room": "Hall", "on_time": "2026-01-05T03:00:00", "on_temperature": 16.0, "off_time": "2026-01-05T21:00:00",
+     "off_temperature": 21.0, "flow_temp": 40, "ambient_temp": 5, "target_temperature": 21},
+    {"room": "Kitchen", "on_time": "2026-01-05T04:00:00", "on_temperature": 17.0, "off_time": "2026-01-05T15:00:00",
+     "off_temperature": 19.0, "flow_temp": 40, "ambient_temp": 5, "target_temperature": 19},
+    {"room": "Kitchen", "on_time": "2026-01-06T04:00:00", "on_temperature": 17.0, "off_time": "2026-01-06T10:00:00",
+     "off_temperature": 16.5, "flow_temp": 40, "ambient_temp": 5, "target_temperature": 19},
+]
+
+
+def _phases():
+    return load_phases(json.dumps(p) for p in PHASES)
+
+
+def test_phases_that_did_not_rise_are_dropped():
+    phases = _phases()
+    assert phases.rooms == ["Hall", "Kitchen"]
+    assert len(phases.room) == 2
+
+
+def test_evaluate_matches_scalar_heating_time():
+    phases = _phases()
+    table = {"Hall": (0.27, 0, 0), "Kitchen": (0.19, 0, 0)}
+    late, early = evaluate(phases, table_coeffs(phases, [table]))
+    for i, p in enumerate(PHASES[:2]):
+        actual = phases.actual[i]
+        error = actual - heating_time(p["room"], p["on_temperature"], p["off_temperature"], 40, 5, table)
+        room = phases.rooms.index(p["room"])
+        assert late[0, room] == pytest.approx(max(error, 0))
+        assert early[0, room] == pytest.approx(max(-error, 0))
+
+
+def test_grid_finds_the_fitting_rate():
+    phases = _phases()
+    coeffs = grid_coeffs(phases, {0: np.arange(0.1, 0.4, 0.01)})
+    late, early = evaluate(phases, coeffs)
+    best = np.argmin(late + early, axis=0)
+    assert coeffs[best[0], 0, 0] == pytest.approx(5/18, abs=0.01)
+    assert coeffs[best[1], 1, 0] == pytest.approx(2/11, abs=0.01)
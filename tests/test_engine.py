@@ -0,0 +1,102 @@
+"""Tests of the room planning engine, simulating rooms that report temperatures in 0.1 degree steps."""
+from datetime import datetime, timedelta
+import math
+
+import pytest
+
+from ..const import HEATING_RATES
+from ..engine import ADVANCE_SCHEDULE, HEATING, RoomPlanner, StartTimes, preheat_time
+from ..thermal import heating_time
+
+FLOW = 40
+OAT = 5
+
+
+def _phase(room, factor, start_temp=16.2, target=20.0, early=10):
+    """
+        Run one setback and rise minute by minute, returning the actions raised and the final state.
+        The room holds start_temp until advanced, then rises at factor times its expected rate.
+    """
+    rate = HEATING_RATES[room][0]*factor
+    t0 = datetime(2026, 1, 5)
+    lead = heating_time(room, start_temp, target, FLOW, OAT)
+    change = t0 + timedelta(minutes=lead + 60)
+    planner = RoomPlanner(change, 16.0, room=room)
+    advanced = None
+    raised = []
+    m = 0
+    while t0 + timedelta(minutes=m) < change:
+        now = t0 + timedelta(minutes=m)
+        true = start_temp if advanced is None else start_temp + rate*(m - advanced)/60
+        temp = round(true, 1)
+        curr_target = 16.0 if advanced is None else target
+        heat_delay = preheat_time(room, temp, curr_target, target, FLOW, OAT) + early
+        actions = planner.update(now, temp, curr_target, change, target, FLOW, OAT, heat_delay)
+        if ADVANCE_SCHEDULE in actions and advanced is None:
+            advanced = m
+        raised.extend(a for a in actions if a != ADVANCE_SCHEDULE)
+        m += 1
+    return raised, planner
+
+
+@pytest.mark.parametrize("room", ["Utility room", "Kitchen", "Landing"])
+def test_phase_on_plan_raises_nothing(room):
+    raised, planner = _phase(room, 1.0)
+    assert raised == []
+
+
+@pytest.mark.parametrize("room", ["Utility room", "Kitchen", "Landing"])
+def test_slow_phase_is_raised_late_once(room):
+    raised, planner = _phase(room, 0.7)
+    assert raised == ["Heating Late"]
+
+
+@pytest.mark.parametrize("room", ["Utility room", "Kitchen"])
+def test_flat_phase_is_raised_stalled_once(room):
+    raised, planner = _phase(room, 0.0)
+    assert raised == ["Heating Stalled"]
+
+
+def test_advance_is_not_repeated_while_heating():
+    raised, planner = _phase("Kitchen", 1.0)
+    assert planner.control_state == HEATING
+
+
+def test_status_is_cleared_when_the_phase_ends():
+    planner = RoomPlanner(datetime(2026, 1, 5, 6), 16.0, room="Kitchen")
+    planner.control_state = HEATING
+    planner.ontime = datetime(2026, 1, 5)
+    planner.heating_status = "late"
+    planner.projected_arrival = datetime(2026, 1, 5, 7)
+    planner.log_phase_end(datetime(2026, 1, 5, 5), 20.0, FLOW, OAT, arrived=True)
+    assert planner.heating_status is None
+    assert planner.projected_arrival is None
+
+
+def test_start_time_stays_put_as_the_room_cools():
+    rates = {"Room": (1.0, 0, 0.02)}
+    start_times = StartTimes(rates)
+    now = datetime(2026, 1, 5)
+    change = now + timedelta(hours=8)
+    first = start_times.preheat(now, {"Room": (19.0, change, 21.0)}, FLOW, OAT)["Room"]
+    later = now + timedelta(hours=2)
+    cooled = OAT + (19.0 - OAT)*math.exp(-0.02*2)
+    assert start_times.preheat(later, {"Room": (cooled, change, 21.0)}, FLOW, OAT)["Room"] == first
+    start_temp = start_times.start_temperature("Room")
+    assert start_temp < 19.0
+    assert first == pytest.approx(heating_time("Room", start_temp, 21.0, FLOW, OAT, rates), abs=0.5)
+
+
+def test_start_time_is_solved_again_when_the_weather_moves():
+    rates = {"Room": (1.0, 0.01, 0.05)}
+    start_times = StartTimes(rates)
+    now = datetime(2026, 1, 5)
+    change = now + timedelta(hours=8)
+    first = start_times.preheat(now, {"Room": (19.0, change, 21.0)}, FLOW, OAT)["Room"]
+    assert start_times.preheat(now, {"Room": (19.0, change, 21.0)}, FLOW + 0.5, OAT)["Room"] == first
+    assert start_times.preheat(now, {"Room": (19.0, change, 21.0)}, FLOW, OAT - 5)["Room"] != first
+
+
+def test_rooms_without_a_cooling_coefficient_are_warned_of(caplog):
+    StartTimes({"Room": (1.0, 0, 0), "Other": (1.0, 0, 0.02)})
+    assert "c2" in caplog.text and "Room" in caplog.text and "Other" not in caplog.text
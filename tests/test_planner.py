@@ -0,0 +1,70 @@
+"""Tests of the headless planner, driven through its JSON lines feed handling."""
+import asyncio
+from datetime import datetime, timedelta
+
+from ..engine import ADVANCE_SCHEDULE
+from ..planner import Feed
+
+SCHEDULE = {"Weekdays": [{"Time": "06:30", "Temp": 17.5}, {"Time": "22:00", "Temp": 16.0}]}
+
+
+class _Reader:
+    def __init__(self, lines):
+        self._lines = list(lines)
+
+    async def readline(self):
+        return self._lines.pop(0).encode() if self._lines else b""
+
+
+def _day_without_targets(rise=0.4, fall=0.1):
+    """
+        A day of readings for the Hall with no target in the feed, the room rising at rise degrees per hour whenever
+        the controller's setpoint, the scheduled one or the advanced one, is above it, and otherwise falling at fall.
+        Returns the decisions published.
+    """
+    decisions = []
+
+    async def publish(decision):
+        decisions.append(decision)
+
+    async def run():
+        feed = Feed(publish)
+        await feed.handle({"type": "heat_pump", "site": "home", "flow": 40, "outside": 5})
+        await feed.handle({"type": "schedule", "site": "home", "room": "Hall", "schedule": SCHEDULE})
+        temperature = 16.0
+        start = datetime(2026, 1, 5)
+        for minute in range(0, 24*60, 2):
+            now = start + timedelta(minutes=minute)
+            await feed.handle({"type": "room", "site": "home", "room": "Hall", "temperature": round(temperature, 1)})
+            await feed.handle({"type": "tick", "site": "home", "time": now.isoformat()})
+            room = feed.site("home").rooms["Hall"]
+            if feed.site("home")._target(room, now) > temperature:
+                temperature += rise*2/60
+            else:
+                temperature -= fall*2/60
+
+    asyncio.run(run())
+    return decisions
+
+
+def test_advanced_setpoint_is_kept_until_the_schedule_change():
+    decisions = _day_without_targets()
+    assert [d["action"] for d in decisions] == [ADVANCE_SCHEDULE]
+
+
+def test_bad_lines_do_not_end_the_feed():
+    decisions = []
+
+    async def publish(decision):
+        decisions.append(decision)
+
+    lines = [
+        "[]",
+        "not json",
+        '{"type": "heat_pump", "site": "home", "flow": 40, "outside": 5}',
+        '{"type": "schedule", "site": "home", "room": "Hall", "schedule": {"Weekdays": [{"Time": "06:30", "Temp": 21.0}, {"Time": "22:00", "Temp": 16.0}]}}',
+        '{"type": "room", "site": "home", "room": "Hall", "temperature": 16.0}',
+        '{"type": "tick", "site": "home", "time": "2026-01-05T06:00:00"}',
+    ]
+    asyncio.run(Feed(publish).run(_Reader(lines)))
+    assert [d["action"] for d in decisions] == [ADVANCE_SCHEDULE]
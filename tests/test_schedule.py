@@ -0,0 +1,37 @@
+"""Tests of the cached weekly schedules."""
+from datetime import datetime
+
+from ..schedule import WeeklySchedule
+
+SCHEDULE = {
+    "Weekdays": [{"Time": "06:30", "Temp": 20.0}, {"Time": "22:00", "Temp": 16.0}],
+    "Weekends": [{"Time": 800, "Temp": 21.0}, {"Time": "23:00", "Temp": 16.0}],
+}
+
+MONDAY = datetime(2026, 1, 5)
+
+
+def test_upcoming_wraps_round_the_week():
+    schedule = WeeklySchedule(SCHEDULE)
+    sunday_night = datetime(2026, 1, 11, 23, 30)
+    assert schedule.upcoming(sunday_night, 2) == [(datetime(2026, 1, 12, 6, 30), 20.0), (datetime(2026, 1, 12, 22, 0), 16.0)]
+
+
+def test_transition_at_now_is_still_upcoming():
+    schedule = WeeklySchedule(SCHEDULE)
+    change = MONDAY.replace(hour=6, minute=30)
+    assert schedule.upcoming(change) == [(change, 20.0)]
+    assert schedule.upcoming(change.replace(second=1)) == [(MONDAY.replace(hour=22), 16.0)]
+
+
+def test_current_is_the_setpoint_in_force():
+    schedule = WeeklySchedule(SCHEDULE)
+    assert schedule.current(MONDAY.replace(hour=3)) == 16.0
+    assert schedule.current(MONDAY.replace(hour=6, minute=30)) == 20.0
+    assert schedule.current(datetime(2026, 1, 10, 9)) == 21.0
+
+
+def test_equal_consecutive_setpoints_are_merged():
+    schedule = WeeklySchedule({"Everyday": [{"Time": "06:00", "Temp": 18.0}, {"Time": "09:00", "Temp": 18.0}, {"Time": "22:00", "Temp": 15.0}]})
+    assert len(schedule) == 14
+    assert schedule.upcoming(MONDAY.replace(hour=7)) == [(MONDAY.replace(hour=22), 15.0)]
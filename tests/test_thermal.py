@@ -0,0 +1,83 @@
+"""Tests of the thermal models, which run without Home Assistant."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from ..const import STALLED_FRACTION
+from ..engine import rate_window
+from ..thermal import HouseModel, RiseRateEstimator, heating_time
+
+RATES = {"A": (1.0, 0, 0), "B": (1.0, 0, 0)}
+
+
+def test_isolated_room_matches_heating_time():
+    model = HouseModel(["A", "B"], RATES, {})
+    warmup = model.warmup_minutes({"A": 16, "B": 20}, {"A": 18}, 40, 5)
+    assert warmup["A"] == pytest.approx(heating_time("A", 16, 18, 40, 5, RATES), abs=0.5)
+
+
+def test_neighbour_held_at_target_warms_more_than_one_cooling_freely():
+    model = HouseModel(["A", "B"], RATES, {("A", "B"): 0.3})
+    held = model.warmup_minutes({"A": 16, "B": 20}, {"A": 18}, 40, 5, floors={"A": 16, "B": 20})
+    free = model.warmup_minutes({"A": 16, "B": 20}, {"A": 18}, 40, 5)
+    assert held["A"] < free["A"] < heating_time("A", 16, 18, 40, 5, RATES)
+
+
+def test_room_that_levels_off_short_of_target_is_none():
+    rates = {"Landing": (0.26, 0, 0), "Hall": (0.27, 0, 0), "Main bedroom": (0.62, 0, 0)}
+    model = HouseModel(rates, rates, {("Landing", "Hall"): 0.1, ("Landing", "Main bedroom"): 0.1})
+    floors = {room: 16 for room in rates}
+    assert model.warmup_minutes(dict(floors), {"Landing": 21}, 40, 5, floors=floors) == {"Landing": None}
+
+
+def test_rooms_only_warm_each_other_while_heating_overlaps():
+    model = HouseModel(["A", "B"], RATES, {("A", "B"): 0.3})
+    floors = {"A": 16, "B": 16}
+    warmup = model.warmup_minutes(dict(floors), {"A": 19, "B": 19}, 40, 5, {"A": 600, "B": 720}, floors)
+    isolated = heating_time("A", 16, 19, 40, 5, RATES)
+    assert warmup["A"] > isolated
+    assert warmup["B"] < isolated
+
+
+def test_horizon_counts_from_each_start():
+    model = HouseModel(["A", "B"], RATES, {})
+    warmup = model.warmup_minutes({"A": 16, "B": 16}, {"A": 18}, 40, 5, {"A": 3000}, {"A": 16, "B": 16}, horizon=240)
+    assert warmup["A"] == pytest.approx(120, abs=0.5)
+
+
+def _quantised_rates(rate, window, minutes=1200, offset=0.03):
+    estimator = RiseRateEstimator(window)
+    start = datetime(2026, 1, 5)
+    rates = []
+    for m in range(minutes):
+        estimator.add(start + timedelta(minutes=m), round(16 + offset + rate*m/60, 1))
+        if estimator.complete:
+            rates.append(estimator.rate)
+    return rates
+
+
+@pytest.mark.parametrize("rate", [0.16, 0.19])
+def test_quantised_slow_rise_is_never_read_as_stalled(rate):
+    rates = _quantised_rates(rate, rate_window(rate))
+    assert rates
+    assert min(rates) > STALLED_FRACTION*rate
+    assert max(abs(r - rate) for r in rates) < 0.1*rate
+
+
+def test_rate_is_not_judged_until_the_window_has_passed():
+    estimator = RiseRateEstimator(timedelta(minutes=60))
+    start = datetime(2026, 1, 5)
+    for m in range(60):
+        estimator.add(start + timedelta(minutes=m), 16 + m/60)
+    assert not estimator.complete
+    estimator.add(start + timedelta(minutes=60), 17)
+    assert estimator.complete
+    assert estimator.rate == pytest.approx(1.0)
+    assert estimator.temperature == pytest.approx(17.0)
+
+
+def test_samples_without_a_temperature_are_skipped():
+    estimator = RiseRateEstimator(timedelta(minutes=60))
+    estimator.add(datetime(2026, 1, 5), None)
+    assert estimator.count == 0
+    assert estimator.rate is None
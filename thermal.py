@@ -0,0 +1,309 @@
+"""Thermal models of the rooms: the scalar heating time, the coupled house model, and the measured rate of rise."""
+from collections import deque
+
+import numpy as np
+
+from .const import HEATING_RATES
+
+
+def heating_time(room, curr, target, flow, oat, rates=HEATING_RATES):
+    mid = (curr + target)/2
+    gain = target - curr
+    hf = flow - mid
+    cf = mid - oat
+    if gain > 0:
+        if hf > 0 and room in rates:
+            coeffs = rates[room]
+            heatdelay = (gain / (coeffs[0] + coeffs[1]*hf - coeffs[2]*cf)) * 60
+        else:
+            heatdelay = 0
+    elif gain < 0 and cf > 0 and room in rates:
+        coeffs = rates[room]
+        heatdelay = (coeffs[0] + coeffs[2]*cf) * gain * 60
+    else:
+        heatdelay = 0
+
+    return heatdelay
+
+
+def heating_rate(room, curr, target, flow, oat, rates=HEATING_RATES):
+    """The rate in degrees per hour at which heating_time has the room rising from curr to target, or None if it plans no rise."""
+    if room not in rates or target <= curr:
+        return None
+    coeffs = rates[room]
+    mid = (curr + target)/2
+    rate = coeffs[0] + coeffs[1]*(flow - mid) - coeffs[2]*(mid - oat)
+    return rate if rate > 0 and flow > mid else None
+
+
+def heating_times(coeffs, curr, target, flow, oat, slope=False):
+    """
+        heating_time for rises as array operations, broadcasting over the arguments, with coeffs having a last axis of (c0, c1, c2).
+        No heating, or a non-positive rate, plans no preheat.
+        With slope, also returns the derivative of the heating time with respect to the starting temperature.
+    """
+    coeffs = np.asarray(coeffs, dtype=float)
+    c0, c1, c2 = coeffs[..., 0], coeffs[..., 1], coeffs[..., 2]
+    mid = (curr + target)/2
+    gain = target - curr
+    hf = flow - mid
+    cf = mid - oat
+    rate = c0 + c1*hf - c2*cf
+    active = (gain > 0) & (hf > 0) & (rate > 0)
+    safe_rate = np.where(active, rate, 1.0)
+    minutes = np.where(active, gain/safe_rate*60, 0.0)
+    if not slope:
+        return minutes
+    return minutes, np.where(active, 60*(gain*(c1 + c2)/2 - safe_rate)/safe_rate**2, 0.0)
+
+
+def cooled_temperature(curr, oat, loss, minutes):
+    """Temperature after cooling freely towards the outside temperature for the minutes, at the c2 loss rate per hour."""
+    return oat + (curr - oat)*np.exp(-loss*minutes/60)
+
+
+def solve_start_times(coeffs, curr, target, lead, flow, oat, tolerance=0.5, iterations=20):
+    """
+        Preheat minutes, and the temperature heating starts from, for rooms that cool freely until heating starts.
+        All arguments are arrays over the rooms, coeffs (rooms, 3), and lead is the minutes until the schedule change.
+        The start s minutes from now satisfies f(s) = s + heating time from the temperature cooled to at s - lead = 0.
+        f increases with s, so Newton's method is used for all rooms together, kept within a bracket on [0, lead]
+        and falling back to bisection, converging in a few iterations. Rooms already due start now.
+    """
+    coeffs = np.asarray(coeffs, dtype=float).reshape(-1, 3)
+    curr = np.asarray(curr, dtype=float)
+    target = np.asarray(target, dtype=float)
+    lead = np.maximum(np.asarray(lead, dtype=float), 0)
+    loss = coeffs[:, 2]
+    low = np.zeros_like(lead)
+    high = lead.copy()
+    start = np.clip(lead - heating_times(coeffs, curr, target, flow, oat), 0, lead)
+    for _ in range(iterations):
+        start_temp = cooled_temperature(curr, oat, loss, start)
+        minutes, slope = heating_times(coeffs, start_temp, target, flow, oat, slope=True)
+        f = start + minutes - lead
+        if np.all((np.abs(f) < tolerance) | ((start == 0) & (f > 0))):
+            break
+        low = np.where(f < 0, start, low)
+        high = np.where(f >= 0, start, high)
+        gradient = 1 + slope*(-loss*(start_temp - oat)/60)
+        step = start - f/np.where(gradient > 0, gradient, 1.0)
+        start = np.where((step > low) & (step < high), step, (low + high)/2)
+    start_temp = cooled_temperature(curr, oat, loss, start)
+    return heating_times(coeffs, start_temp, target, flow, oat), start_temp
+
+
+class HouseModel:
+    """
+        First order model of the rooms as a network of thermal nodes, rates in degrees per hour.
+        Each room i follows
+            dT_i/dt = h_i * (c0_i + c1_i * (flow - T_i)) - c2_i * (T_i - oat) + sum_j g_ij * (T_j - T_i)
+        where (c0, c1, c2) are the HEATING_RATES coefficients, h_i is 1 while the room is heating,
+        and g_ij are the conductances between adjacent rooms.
+        This is the scalar model in heating_time, with the room temperature in place of the mid point,
+        plus the coupling terms. While the pattern of heating and held rooms is unchanged the free rooms follow the
+        affine system dT/dt = A T + b, and A is symmetric, as the conductances are. So it is diagonalised once for
+        each pattern, and the exact solution exp(At) T0 + A^-1 (exp(At) - I) b is evaluated at every minute up to
+        the next change of pattern as one array operation.
+    """
+
+    def __init__(self, rooms, rates, conductances):
+        self.rooms = list(rooms)
+        self._index = {room: i for i, room in enumerate(self.rooms)}
+        self._coeffs = np.array([rates.get(room, (0, 0, 0)) for room in self.rooms], dtype=float).reshape(-1, 3)
+        self._base, self._emit, self._loss = self._coeffs.T
+        n = len(self.rooms)
+        coupling = np.zeros((n, n))
+        for (a, b), g in conductances.items():
+            if a in self._index and b in self._index and a != b:
+                i, j = self._index[a], self._index[b]
+                coupling[i, j] += g
+                coupling[j, i] += g
+        self._coupling = coupling - np.diag(coupling.sum(axis=1))
+
+    def _trajectory(self, free, heating, temps, flow, oat, hours):
+        """
+            Temperatures of the free rooms at each of the hours from now, as a (hours, free rooms) array,
+            with the other rooms held at their temperatures in temps.
+        """
+        held = ~free
+        h = heating[free].astype(float)
+        a = self._coupling[np.ix_(free, free)] - np.diag(self._loss[free] + h * self._emit[free])
+        b = self._loss[free] * oat + h * (self._base[free] + self._emit[free] * flow)
+        b = b + self._coupling[np.ix_(free, held)] @ temps[held]
+        rates, vectors = np.linalg.eigh(a)
+        decaying = np.abs(rates) > 1e-12
+        growth = np.exp(np.outer(hours, rates))
+        gain = np.where(decaying, (growth - 1) / np.where(decaying, rates, 1.0), hours[:, None])
+        return (growth * (vectors.T @ temps[free]) + gain * (vectors.T @ b)) @ vectors.T
+
+    def _arrivals(self, temps, goal, floor, start, flow, oat, horizon, step):
+        """
+            Minutes from each room's start until it reaches its goal, NaN for rooms without a goal or that do not arrive
+            within the horizon from their start. Rooms not heating are held at their floor once they cool to it,
+            and rooms that arrive are held at their goal.
+        """
+        temps = temps.copy()
+        floor = floor.copy()
+        minutes = np.full(len(temps), np.nan)
+        pending = ~np.isnan(goal)
+        goal = np.where(pending, goal, np.inf)
+        held = np.zeros(len(temps), dtype=bool)
+        t = 0.0
+        while True:
+            heating = pending & (start <= t)
+            reached = heating & (temps >= goal)
+            minutes[reached] = t - start[reached]
+            floor[reached] = goal[reached]
+            pending &= ~reached & (t < start + horizon)
+            if not pending.any():
+                return minutes
+            heating &= pending
+            held = (held | (temps <= floor)) & ~heating
+            temps[held] = floor[held]
+
+            later = start[pending & (start > t)]
+            end = min((start + horizon)[pending].min(), later.min() if later.size else np.inf)
+            times = np.append(np.arange(step, end - t, step), end - t)
+            free = ~held
+            if not free.any():
+                t = end
+                continue
+            path = self._trajectory(free, heating, temps, flow, oat, times / 60)
+
+            """The pattern changes at the first minute a heating room arrives or a free room cools to its floor."""
+            free_goal = np.where(heating, goal, np.inf)[free]
+            free_floor = np.where(heating, -np.inf, floor)[free]
+            events = ((path >= free_goal) | (path < free_floor)).any(axis=1)
+            k = int(np.argmax(events)) if events.any() else len(times) - 1
+            before = times[k - 1] if k > 0 else 0.0
+            previous = path[k - 1] if k > 0 else temps[free]
+            arrived = path[k] >= free_goal
+            rooms = np.flatnonzero(free)[arrived]
+            if rooms.size:
+                fraction = (free_goal[arrived] - previous[arrived]) / (path[k][arrived] - previous[arrived])
+                minutes[rooms] = np.maximum(t + before + (times[k] - before) * fraction - start[rooms], 0)
+                pending[rooms] = False
+                floor[rooms] = goal[rooms]
+                held[rooms] = True
+            temps[free] = path[k]
+            held[np.flatnonzero(free)[path[k] < free_floor]] = True
+            t += times[k]
+
+    def warmup_minutes(self, curr, targets, flow, oat, leads=None, floors=None, horizon=24*60, step=1, iterations=5):
+        """
+            Minutes of heating for each room in targets to reach its target, with the rooms heating together.
+            curr holds the measured temperature of every room, and floors the setpoint the controller holds each at,
+            so a room that is not heating cools freely to its floor and is then held there, as is a room once it arrives.
+            Rooms in targets without a lead, the minutes until the target is due, heat from now. A room with a lead starts
+            its warm-up before then, and the starts are iterated from the scalar heating times until they agree with the
+            coupled warm-ups, so that rooms warm each other only where their heating will overlap.
+            Rooms that do not get there within the horizon from their start get None, so that the scalar heating_time is used.
+            Returns a dict keyed by the rooms in targets.
+        """
+        leads = leads or {}
+        floors = floors or {}
+        n = len(self.rooms)
+        temps = np.array([curr[room] for room in self.rooms], dtype=float)
+        floor = np.array([floors.get(room, -np.inf) for room in self.rooms], dtype=float)
+        goal = np.full(n, np.nan)
+        lead = np.full(n, np.nan)
+        for room, target in targets.items():
+            goal[self._index[room]] = target
+            lead[self._index[room]] = leads.get(room, np.nan)
+        planned = ~np.isnan(lead)
+        scalar = heating_times(self._coeffs, temps, np.where(np.isnan(goal), temps, goal), flow, oat)
+        lead = np.where(planned, np.maximum(lead, 0), 0.0)
+        start = np.where(planned, np.clip(lead - scalar, 0, lead), 0.0)
+        low = np.zeros(n)
+        high = lead.copy()
+        previous = None
+        for _ in range(iterations):
+            minutes = self._arrivals(temps, goal, floor, start, flow, oat, horizon, step)
+            solving = planned & ~np.isnan(minutes)
+            f = np.where(solving, start + minutes - lead, 0.0)
+            if np.all((np.abs(f) < step) | ((start == 0) & (f > 0))):
+                break
+            """
+                Starting earlier gains less than it costs where the neighbours are not yet warm, so the arrival is
+                solved for with the secant method, kept within a bracket and falling back to bisection.
+            """
+            low = np.where(solving & (f < 0), start, low)
+            high = np.where(solving & (f >= 0), start, high)
+            slope = np.ones(n)
+            if previous is not None:
+                ds = start - previous[0]
+                moved = np.abs(ds) > 1e-9
+                slope = np.where(moved, (f - previous[1]) / np.where(moved, ds, 1.0), 1.0)
+            step_to = start - f / np.where(slope > 0, slope, 1.0)
+            previous = (start, f)
+            start = np.where(solving, np.where((step_to > low) & (step_to < high), step_to, (low + high) / 2), start)
+        return {room: None if np.isnan(minutes[self._index[room]]) else float(minutes[self._index[room]]) for room in targets}
+
+
+class RiseRateEstimator:
+    """
+        Least squares rate of temperature change over a window of recent time, in degrees per hour.
+        Samples are held in a deque and the regression sums are updated as samples enter and leave the window,
+        so each sample costs O(1) amortised. Times are measured from the first sample after a reset.
+        The window is measured in time rather than samples, so that the span of the fit, and with it the resolution
+        of the 0.1 degree steps the temperatures are reported in, does not depend on the update interval.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._samples = deque()
+        self.reset()
+
+    def reset(self):
+        self._samples.clear()
+        self._origin = None
+        self._latest = 0.0
+        self._st = self._sT = self._stt = self._stT = 0.0
+
+    @property
+    def count(self):
+        return len(self._samples)
+
+    @property
+    def complete(self):
+        """Whether the samples since the reset span the whole window, so that the rate can be judged."""
+        return self._origin is not None and self._latest >= self.window.total_seconds()/3600
+
+    def add(self, when, temp):
+        if temp is None:
+            return
+        if self._origin is None:
+            self._origin = when
+        t = (when - self._origin).total_seconds()/3600
+        self._samples.append((t, temp))
+        self._latest = t
+        self._st += t
+        self._sT += temp
+        self._stt += t*t
+        self._stT += t*temp
+        start = t - self.window.total_seconds()/3600
+        while self._samples[0][0] < start:
+            old_t, old_T = self._samples.popleft()
+            self._st -= old_t
+            self._sT -= old_T
+            self._stt -= old_t*old_t
+            self._stT -= old_t*old_T
+
+    @property
+    def rate(self):
+        """Degrees per hour, or None until there are two distinct sample times."""
+        n = self.count
+        denom = n*self._stt - self._st*self._st
+        if n < 2 or denom <= 1e-12:
+            return None
+        return (n*self._stT - self._st*self._sT)/denom
+
+    @property
+    def temperature(self):
+        """The fitted temperature at the latest sample, which resolves finer than the readings, or None without a rate."""
+        rate = self.rate
+        if rate is None:
+            return None
+        n = self.count
+        return self._sT/n + rate*(self._latest - self._st/n)